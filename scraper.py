@@ -5,16 +5,65 @@ Mengambil berita dari website Indonesia untuk Instagram content
 """
 
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from requests.utils import DEFAULT_ACCEPT_ENCODING
+from urllib3.util.retry import Retry
+import lxml.html
+from lxml.cssselect import CSSSelector
 import json
 import time
+import itertools
 import random
 from datetime import datetime
+from functools import lru_cache
+from hashlib import blake2b
 from urllib.parse import urljoin, urlparse
 import re
+from collections import Counter
 from typing import List, Dict, Optional
 from config_scraper import INDONESIAN_NEWS_SOURCES, INSTAGRAM_CATEGORIES, SCRAPING_SETTINGS
 
+# Chunk size used when streaming HTML into the parser
+STREAM_CHUNK_SIZE = 16384
+# An in-page encoding declaration near the top of the document
+_META_CHARSET_RE = re.compile(rb'<meta[^>]+charset', re.I)
+
+@lru_cache(maxsize=None)
+def _compiled_selector(selector: str) -> CSSSelector:
+    """Compile a CSS selector to XPath once and reuse it"""
+    return CSSSelector(selector)
+
+def _select(element, selector: str) -> list:
+    """Run a cached CSS selector against an lxml element"""
+    return _compiled_selector(selector)(element)
+
+def _select_one(element, selector: str):
+    """Return the first match of a CSS selector, or None"""
+    matches = _select(element, selector)
+    return matches[0] if matches else None
+
+def _text(element) -> str:
+    """Extract stripped text content from an lxml element"""
+    return element.text_content().strip() if element is not None else ""
+
+def _build_keyword_index():
+    """Map each lowercased keyword to its categories and compile one regex for all of them"""
+    keyword_categories = {}
+    for category, config in INSTAGRAM_CATEGORIES.items():
+        for keyword in config['keywords']:
+            keyword = keyword.lower().strip()
+            if keyword and category not in keyword_categories.setdefault(keyword, ()):
+                keyword_categories[keyword] += (category,)
+
+    if not keyword_categories:
+        return None, keyword_categories
+
+    # Longest keywords first so "sepak bola" wins over "bola" at the same position
+    alternatives = sorted(keyword_categories, key=len, reverse=True)
+    return re.compile('|'.join(map(re.escape, alternatives))), keyword_categories
+
+_KEYWORD_RE, _KEYWORD_CATEGORIES = _build_keyword_index()
+
 class IndonesianNewsScraper:
     def __init__(self):
         self.session = requests.Session()
@@ -22,10 +71,52 @@ class IndonesianNewsScraper:
             'User-Agent': SCRAPING_SETTINGS['user_agent'],
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
             'Accept-Language': 'id-ID,id;q=0.9,en;q=0.8',
-            'Accept-Encoding': 'gzip, deflate',
+            'Accept-Encoding': DEFAULT_ACCEPT_ENCODING,  # includes br when brotli is installed
             'Connection': 'keep-alive',
         })
+
+        # Keep connections to every source alive and retry transient failures
+        adapter = HTTPAdapter(
+            pool_connections=32,
+            pool_maxsize=64,
+            max_retries=Retry(
+                total=3,
+                backoff_factor=0.3,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=frozenset(['GET'])
+            )
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
         self.scraped_articles = []
+        self._post_counter = itertools.count(1)
+
+    def _html_parser(self, response, head: bytes):
+        """Pick the page encoding: Content-Type charset, then an early <meta charset>, else UTF-8"""
+        # requests falls back to ISO-8859-1 for text/* without a charset, so only trust an explicit one
+        if 'charset=' in response.headers.get('Content-Type', '').lower() and response.encoding:
+            try:
+                return lxml.html.HTMLParser(encoding=response.encoding)
+            except LookupError:
+                pass
+        if _META_CHARSET_RE.search(head):
+            return lxml.html.HTMLParser()  # lxml honours the page's own declaration
+        return lxml.html.HTMLParser(encoding='utf-8')
+
+    def _fetch_html(self, url: str):
+        """Fetch a page and stream-parse it chunk by chunk into an lxml tree"""
+        with self.session.get(url, stream=True, timeout=SCRAPING_SETTINGS['timeout']) as response:
+            response.raise_for_status()
+            chunks = response.iter_content(chunk_size=STREAM_CHUNK_SIZE)
+            head = next(chunks, b'')
+            parser = self._html_parser(response, head)
+            if head:
+                parser.feed(head)
+            for chunk in chunks:
+                parser.feed(chunk)
+
+        return parser.close()
 
     def scrape_news_from_source(self, source_key: str, max_articles: int = None) -> List[Dict]:
         """Scrape news from a specific source"""
@@ -37,17 +128,12 @@ class IndonesianNewsScraper:
         print(f"🔍 Mengambil berita dari {source_config['name']}...")
 
         try:
-            response = self.session.get(
-                source_config['url'],
-                timeout=SCRAPING_SETTINGS['timeout']
-            )
-            response.raise_for_status()
-
-            soup = BeautifulSoup(response.content, 'html.parser')
+            root = self._fetch_html(source_config['url'])
+            scraped_at = datetime.now().isoformat()
             articles = []
 
             # Find articles based on selector
-            article_elements = soup.select(source_config['selector'])
+            article_elements = _select(root, source_config['selector'])
 
             if not article_elements:
                 print(f"⚠️ Tidak ada artikel ditemukan di {source_config['name']}")
@@ -58,30 +144,28 @@ class IndonesianNewsScraper:
             for i, article in enumerate(article_elements[:max_articles]):
                 try:
                     # Extract title
-                    title_elem = article.select_one(source_config['title_selector'])
-                    title = title_elem.get_text(strip=True) if title_elem else ""
+                    title = _text(_select_one(article, source_config['title_selector']))
 
                     # Extract link
-                    link_elem = article.select_one(source_config['link_selector'])
-                    link = link_elem.get('href') if link_elem else ""
+                    link_elem = _select_one(article, source_config['link_selector'])
+                    link = link_elem.get('href', '') if link_elem is not None else ""
 
                     # Make absolute URL
                     if link:
                         link = urljoin(source_config['url'], link)
 
                     # Extract summary/description if available
-                    summary_elem = article.select_one('p, .summary, .desc')
-                    summary = summary_elem.get_text(strip=True) if summary_elem else ""
+                    summary = _text(_select_one(article, 'p, .summary, .desc'))
 
                     # Extract image if available
-                    img_elem = article.select_one('img')
-                    image_url = img_elem.get('src') if img_elem else ""
+                    img_elem = _select_one(article, 'img')
+                    image_url = img_elem.get('src', '') if img_elem is not None else ""
                     if image_url:
                         image_url = urljoin(source_config['url'], image_url)
 
                     # Extract publication date if available
-                    date_elem = article.select_one('time, .date, .published')
-                    pub_date = date_elem.get('datetime') or date_elem.get('content') if date_elem else ""
+                    date_elem = _select_one(article, 'time, .date, .published')
+                    pub_date = (date_elem.get('datetime') or date_elem.get('content') or "") if date_elem is not None else ""
 
                     if title and link:
                         article_data = {
@@ -92,7 +176,7 @@ class IndonesianNewsScraper:
                             'source': source_config['name'],
                             'category': source_config['category'],
                             'publish_date': pub_date,
-                            'scraped_at': datetime.now().isoformat(),
+                            'scraped_at': scraped_at,
                             'source_key': source_key
                         }
                         articles.append(article_data)
@@ -119,14 +203,13 @@ class IndonesianNewsScraper:
         content = f"{title_lower} {summary_lower}"
 
         # Score for each category
-        category_scores = {}
+        category_scores = dict.fromkeys(INSTAGRAM_CATEGORIES, 0)
 
-        for category, config in INSTAGRAM_CATEGORIES.items():
-            score = 0
-            for keyword in config['keywords']:
-                if keyword in content:
-                    score += content.count(keyword)
-            category_scores[category] = score
+        if _KEYWORD_RE is not None:
+            # One pass over the content, then bucket keyword hits per category
+            for keyword, hits in Counter(_KEYWORD_RE.findall(content)).items():
+                for category in _KEYWORD_CATEGORIES[keyword]:
+                    category_scores[category] += hits
 
         # Return category with highest score
         if category_scores:
@@ -221,14 +304,16 @@ class IndonesianNewsScraper:
         )
 
         instagram_posts = []
+        created_at = datetime.now().isoformat()
 
         for i, article in enumerate(selected_articles):
             print(f"📝 Generate post {i+1}/{len(selected_articles)}: {article['title'][:50]}...")
 
             post_content = self.generate_instagram_content(article)
+            title_hash = blake2b(article['title'].encode('utf-8'), digest_size=6).hexdigest()
 
             instagram_post = {
-                'id': f"post_{i+1}_{int(time.time())}",
+                'id': f"post_{next(self._post_counter)}_{title_hash}",
                 'title': article['title'],
                 'caption': post_content['caption'],
                 'image_url': post_content['image_url'],
@@ -237,7 +322,7 @@ class IndonesianNewsScraper:
                 'hashtags': post_content['hashtags'],
                 'source': article['source'],
                 'link': article['link'],
-                'created_at': datetime.now().isoformat(),
+                'created_at': created_at,
                 'original_article': article
             }
 
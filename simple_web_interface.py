@@ -5,18 +5,54 @@ Using Z.ai API - Real Content Generation Only
 """
 
 import os
-import json
+import re
+import time
+import orjson
+import gzip
+import hashlib
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache, partial
 from datetime import datetime
-from flask import Flask, request, jsonify, render_template_string
-from flask_cors import CORS
+from typing import Optional
+from cachetools import TTLCache
+from flask import Flask, Response, request, send_from_directory, stream_with_context
 from dotenv import load_dotenv
-from url_content_generator import URLContentGenerator, GeneratedContent
+from url_content_generator import URLContentGenerator, GeneratedContent, HISTORY_INDEX, result_filename
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 # Load environment variables
 load_dotenv()
 
 app = Flask(__name__)
-CORS(app)
+
+# Constant CORS headers for the public API (replaces flask_cors)
+_CORS_HEADERS = [
+    ('Access-Control-Allow-Origin', '*'),
+    ('Access-Control-Allow-Methods', 'GET, POST, OPTIONS'),
+    ('Access-Control-Allow-Headers', 'Content-Type'),
+]
+
+@app.before_request
+def _cors_preflight():
+    """Answer CORS preflight requests directly"""
+    if request.method == 'OPTIONS':
+        return Response(status=204)
+
+@app.after_request
+def _add_cors_headers(response: Response) -> Response:
+    """Add the CORS headers to every response"""
+    response.headers.extend(_CORS_HEADERS)
+    return response
+
+def ojsonify(obj, status: int = 200) -> Response:
+    """JSON response encoded with orjson instead of Flask's jsonify"""
+    return Response(orjson.dumps(obj), status=status, mimetype='application/json')
 
 # Initialize generator
 api_key = os.getenv("ZAI_API_KEY")
@@ -26,6 +62,16 @@ if not api_key:
 
 generator = URLContentGenerator(api_key)
 
+def _prewarm_connection():
+    """Open a pooled connection to Z.ai (DNS + TCP + TLS) before the first real request"""
+    try:
+        generator.session.get(f"{generator.base_url}/models", timeout=5)
+    except Exception:
+        pass  # Best effort only; the first request will connect normally
+
+# Runs once per process, so every gunicorn worker warms its own pool
+threading.Thread(target=_prewarm_connection, name="zai-prewarm", daemon=True).start()
+
 # HTML Template
 HTML_TEMPLATE = """
 <!DOCTYPE html>
@@ -337,7 +383,7 @@ HTML_TEMPLATE = """
     <script>
         const API_BASE = window.location.origin;
 
-        async function generateContent() {
+        function generateContent() {
             const topic = document.getElementById('topic').value;
             const url = document.getElementById('url').value;
 
@@ -359,36 +405,48 @@ HTML_TEMPLATE = """
             document.getElementById('results').innerHTML = '';
             showStatus('Starting content generation...', 'info');
 
-            try {
-                const response = await fetch('/api/generate', {
-                    method: 'POST',
-                    headers: {
-                        'Content-Type': 'application/json',
-                    },
-                    body: JSON.stringify({ topic, url })
-                });
-
-                if (!response.ok) {
-                    throw new Error(`HTTP ${response.status}: ${response.statusText}`);
-                }
+            // Each part is rendered as soon as the server streams it
+            const content = { topic, original_url: url };
+            const params = new URLSearchParams({ topic, url });
+            const source = new EventSource(`/api/generate/stream?${params}`);
 
-                const data = await response.json();
-
-                if (data.success) {
-                    showStatus('Content generated successfully!', 'success');
-                    displayResults(data.content);
-                } else {
-                    showStatus(`Error: ${data.error}`, 'error');
-                }
+            const finish = () => {
+                source.close();
 
-            } catch (error) {
-                showStatus(`Generation failed: ${error.message}`, 'error');
-            } finally {
                 // Reset button state
                 btnIcon.textContent = '🚀';
                 btnText.textContent = 'Generate Content';
                 button.disabled = false;
-            }
+            };
+
+            const update = (event) => {
+                Object.assign(content, JSON.parse(event.data));
+                displayResults(content);
+            };
+
+            source.addEventListener('status', (event) => {
+                showStatus(JSON.parse(event.data).message, 'info');
+            });
+            source.addEventListener('summary', update);
+            source.addEventListener('caption', update);
+            source.addEventListener('image', update);
+
+            source.addEventListener('done', (event) => {
+                const data = JSON.parse(event.data);
+                showStatus('Content generated successfully!', 'success');
+                displayResults(data.content);
+                finish();
+            });
+
+            source.addEventListener('failed', (event) => {
+                showStatus(`Error: ${JSON.parse(event.data).error}`, 'error');
+                finish();
+            });
+
+            source.onerror = () => {
+                showStatus('Generation failed: connection to server lost', 'error');
+                finish();
+            };
         }
 
         function showStatus(message, type) {
@@ -405,11 +463,7 @@ HTML_TEMPLATE = """
 
         function displayResults(content) {
             const resultsDiv = document.getElementById('results');
-
-            resultsDiv.innerHTML = `
-                <div class="result-card">
-                    <h3>Generated Instagram Content</h3>
-
+            const sections = [`
                     <div class="result-section">
                         <h4>📰 Topic</h4>
                         <div class="result-content">
@@ -417,14 +471,21 @@ HTML_TEMPLATE = """
                             <small>Source: ${content.original_url}</small>
                         </div>
                     </div>
+            `];
 
+            if (content.news_summary) {
+                sections.push(`
                     <div class="result-section">
                         <h4>📝 News Summary</h4>
                         <div class="result-content">
                             ${content.news_summary.replace(/\\n/g, '<br>')}
                         </div>
                     </div>
+                `);
+            }
 
+            if (content.generated_caption) {
+                sections.push(`
                     <div class="result-section">
                         <h4>📱 Instagram Caption</h4>
                         <div class="result-content">
@@ -435,10 +496,14 @@ HTML_TEMPLATE = """
                     <div class="result-section">
                         <h4>🏷️ Hashtags</h4>
                         <div class="hashtags">
-                            ${content.hashtags.map(tag => `<span class="hashtag">${tag}</span>`).join('')}
+                            ${(content.hashtags || []).map(tag => `<span class="hashtag">${tag}</span>`).join('')}
                         </div>
                     </div>
+                `);
+            }
 
+            if (content.generated_image_url) {
+                sections.push(`
                     <div class="result-section">
                         <h4>🎨 Generated Image</h4>
                         <div class="image-preview">
@@ -449,13 +514,24 @@ HTML_TEMPLATE = """
                             <a href="${content.generated_image_url}" target="_blank">${content.generated_image_url}</a>
                         </div>
                     </div>
+                `);
+            }
 
+            if (content.created_at) {
+                sections.push(`
                     <div class="result-section">
                         <h4>📅 Created At</h4>
                         <div class="result-content">
                             ${new Date(content.created_at).toLocaleString()}
                         </div>
                     </div>
+                `);
+            }
+
+            resultsDiv.innerHTML = `
+                <div class="result-card">
+                    <h3>Generated Instagram Content</h3>
+                    ${sections.join('')}
                 </div>
             `;
         }
@@ -481,24 +557,214 @@ HTML_TEMPLATE = """
 </html>
 """
 
+def _minify_css(css: str) -> str:
+    """Drop comments and redundant whitespace from a CSS block"""
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};,>])\s*', r'\1', css)
+    css = re.sub(r':\s+', ':', css)
+    return css.replace(';}', '}').strip()
+
+def _minify_html(html: str) -> str:
+    """Minify <style> blocks and collapse whitespace everywhere except <script> blocks"""
+    html = re.sub(
+        r'(<style[^>]*>)(.*?)(</style>)',
+        lambda m: m.group(1) + _minify_css(m.group(2)) + m.group(3),
+        html,
+        flags=re.S | re.I
+    )
+
+    # Odd indexes are <script> blocks, which keep their formatting (JS line comments)
+    parts = re.split(r'(<script\b.*?</script>)', html, flags=re.S | re.I)
+    for i in range(0, len(parts), 2):
+        part = re.sub(r'<!--.*?-->', '', parts[i], flags=re.S)
+        parts[i] = re.sub(r'\s+', ' ', part)
+    return ''.join(parts).strip()
+
+HTML_TEMPLATE = _minify_html(HTML_TEMPLATE)
+
+# The template has no dynamic parts, so encode and compress it once and serve the bytes directly
+_INDEX_BYTES = HTML_TEMPLATE.encode('utf-8')
+_INDEX_ETAG = hashlib.md5(_INDEX_BYTES).hexdigest()
+STATIC_INDEX = "index.html"
+
+# Precompressed variants as (content-encoding, body, etag, static filename), preferred first
+_INDEX_ENCODED = [('gzip', gzip.compress(_INDEX_BYTES, 9), f"{_INDEX_ETAG}-gz", f"{STATIC_INDEX}.gz")]
+if brotli is not None:
+    _INDEX_ENCODED.insert(0, ('br', brotli.compress(_INDEX_BYTES, quality=11), f"{_INDEX_ETAG}-br", f"{STATIC_INDEX}.br"))
+
+def _write_static_index() -> bool:
+    """Write the page and its precompressed companions to the static folder"""
+    files = [(STATIC_INDEX, _INDEX_BYTES)] + [(name, body) for _, body, _, name in _INDEX_ENCODED]
+    try:
+        os.makedirs(app.static_folder, exist_ok=True)
+        for name, body in files:
+            path = os.path.join(app.static_folder, name)
+            # Each gunicorn worker runs this at import, so every writer needs its own temp file
+            tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            try:
+                with open(tmp_path, 'wb') as f:
+                    f.write(body)
+                os.replace(tmp_path, path)
+            except OSError:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        return True
+    except OSError as e:
+        print(f"⚠️ Could not write {STATIC_INDEX} to {app.static_folder}, serving it from memory: {e}")
+        return False
+
+_STATIC_INDEX_READY = _write_static_index()
+
+# Behind Apache/lighttpd, set USE_X_SENDFILE=1 so the server streams the file itself.
+# Behind nginx, serve it without touching Flask:
+#   location = / { root <app dir>/static; try_files /index.html =404; gzip_static on; }
+app.config["USE_X_SENDFILE"] = os.getenv("USE_X_SENDFILE") == "1"
+
 @app.route('/')
 def index():
     """Main web interface"""
-    return render_template_string(HTML_TEMPLATE)
+    encoding, body, etag, filename = None, _INDEX_BYTES, _INDEX_ETAG, STATIC_INDEX
+    for candidate in _INDEX_ENCODED:
+        if request.accept_encodings[candidate[0]]:
+            encoding, body, etag, filename = candidate
+            break
+
+    if _STATIC_INDEX_READY:
+        response = send_from_directory(
+            app.static_folder, filename, mimetype='text/html', etag=etag, max_age=3600
+        )
+    elif request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+    else:
+        response = Response(body, mimetype='text/html')
+        response.set_etag(etag)
+
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Cache-Control'] = 'public, max-age=3600'
+    response.vary.add('Accept-Encoding')
+    return response
+
+# /api/test bodies are fixed, and the Z.ai ping result is reused for API_TEST_TTL seconds
+API_TEST_TTL = 60
+_API_TEST_OK = orjson.dumps({"success": True, "message": "API connection successful"})
+_API_TEST_FAILED = orjson.dumps({"success": False, "error": "API connection failed"})
+
+@lru_cache(maxsize=1)
+def _api_connection_ok(time_window: int) -> bool:
+    """Test the Z.ai connection once per time window"""
+    return generator.test_api_connection()
 
 @app.route('/api/test')
 def test_api():
     """Test Z.ai API connection"""
     try:
-        if generator.test_api_connection():
-            return jsonify({"success": True, "message": "API connection successful"})
-        else:
-            return jsonify({"success": False, "error": "API connection failed"})
+        connected = _api_connection_ok(int(time.monotonic() // API_TEST_TTL))
+        return Response(_API_TEST_OK if connected else _API_TEST_FAILED, mimetype='application/json')
     except Exception as e:
-        return jsonify({"success": False, "error": str(e)})
+        return ojsonify({"success": False, "error": str(e)})
+
+HISTORY_LIMIT = 10
+HISTORY_TAIL_BYTES = 8192
+
+# Single background writer: keeps disk I/O off the request path and serializes index appends
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="result-writer")
+
+def _read_history_index() -> list:
+    """Return the newest history entries from the tail of the index file"""
+    with open(HISTORY_INDEX, 'rb') as f:
+        size = f.seek(0, os.SEEK_END)
+        f.seek(max(0, size - HISTORY_TAIL_BYTES))
+        lines = f.read().splitlines()
+
+    # The first line is probably cut in half when we didn't read from the start
+    if size > HISTORY_TAIL_BYTES:
+        lines = lines[1:]
+
+    history = []
+    for line in reversed(lines):
+        if len(history) == HISTORY_LIMIT:
+            break
+        try:
+            history.append(orjson.loads(line))
+        except ValueError:
+            continue
+    return history
+
+# Recent generations keyed by (topic, sha1(url)), so repeated submissions skip the Z.ai pipeline
+_generation_cache = TTLCache(maxsize=512, ttl=3600)
+_generation_cache_lock = threading.Lock()
+
+def _generation_cache_key(url: str, topic: str) -> tuple:
+    """Cache key for a (url, topic) generation request"""
+    return (topic, hashlib.sha1(url.encode('utf-8')).hexdigest())
+
+# Worker threads for the Z.ai calls made by the streaming endpoint
+_pipeline = ThreadPoolExecutor(max_workers=8, thread_name_prefix="zai-pipeline")
+
+def _build_content(url: str, topic: str, generated: dict, image_url: str) -> GeneratedContent:
+    """Assemble the final GeneratedContent from the summary/caption call and the image URL"""
+    return GeneratedContent(
+        topic=topic,
+        original_url=url,
+        news_summary=generated["summary"],
+        generated_caption=generated["caption"],
+        generated_image_url=image_url,
+        hashtags=generated["hashtags"],
+        created_at=datetime.now().isoformat(timespec="seconds")
+    )
+
+def _store_result(cache_key: tuple, content: GeneratedContent) -> str:
+    """Save the result in the background and cache it; returns the filename"""
+    # Save to file in the background; the filename is fixed up front
+    filename = result_filename(content.created_at)
+
+    # Cache before submitting so a failed save can't be overwritten by this insert
+    with _generation_cache_lock:
+        _generation_cache[cache_key] = (content, filename)
+
+    _writer.submit(generator.save_results_to_file, content, filename).add_done_callback(
+        partial(_check_saved, cache_key, filename)
+    )
+    return filename
+
+def _check_saved(cache_key: tuple, filename: str, future) -> None:
+    """Report background save failures and stop serving a filename that never reached disk"""
+    try:
+        saved = future.result()
+    except Exception as e:
+        print(f"⚠️ Background save of {filename} failed: {e}")
+        saved = filename if os.path.exists(filename) else ""
+
+    if not saved:
+        with _generation_cache_lock:
+            cached = _generation_cache.get(cache_key)
+            if cached and cached[1] == filename:
+                del _generation_cache[cache_key]
+
+def _sse(event: str, data: dict) -> str:
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {orjson.dumps(data).decode('utf-8')}\n\n"
+
+def _get_cached_result(cache_key: tuple) -> Optional[tuple]:
+    """Return a cached (content, filename) for this request, if any"""
+    with _generation_cache_lock:
+        return _generation_cache.get(cache_key)
+
+def _read_result_file(path: str) -> Optional[dict]:
+    """Parse a saved result file; returns None for unreadable or malformed files"""
+    try:
+        with open(path, 'rb') as f:
+            result = orjson.loads(f.read())
+    except (OSError, orjson.JSONDecodeError):
+        return None
+    return result if isinstance(result, dict) else None
 
 @app.route('/api/generate', methods=['POST'])
-def generate_content():
+async def generate_content():
     """Generate Instagram content from URL"""
     try:
         data = request.json
@@ -506,86 +772,155 @@ def generate_content():
         url = data.get('url')
 
         if not topic or not url:
-            return jsonify({
+            return ojsonify({
                 "success": False,
                 "error": "Both topic and URL are required"
-            }), 400
+            }, 400)
+
+        cache_key = _generation_cache_key(url, topic)
+        cached = _get_cached_result(cache_key)
+        if cached:
+            generated_content, filename = cached
+            return ojsonify({
+                "success": True,
+                "content": generated_content.to_dict(),
+                "filename": filename,
+                "cached": True
+            })
 
         # Generate content
-        generated_content = generator.process_url_content(url, topic)
+        generated_content = await generator.aprocess_url_content_combined(url, topic)
 
         if not generated_content:
-            return jsonify({
+            return ojsonify({
                 "success": False,
                 "error": "Failed to generate content"
-            }), 500
+            }, 500)
 
-        # Convert to dict for JSON response
-        content_dict = {
-            "topic": generated_content.topic,
-            "original_url": generated_content.original_url,
-            "news_summary": generated_content.news_summary,
-            "generated_caption": generated_content.generated_caption,
-            "generated_image_url": generated_content.generated_image_url,
-            "hashtags": generated_content.hashtags,
-            "created_at": generated_content.created_at
-        }
-
-        # Save to file
-        filename = generator.save_results_to_file(generated_content)
+        filename = _store_result(cache_key, generated_content)
 
-        return jsonify({
+        return ojsonify({
             "success": True,
-            "content": content_dict,
+            "content": generated_content.to_dict(),
             "filename": filename
         })
 
     except Exception as e:
-        return jsonify({
+        return ojsonify({
             "success": False,
             "error": str(e)
-        }), 500
+        }, 500)
+
+@app.route('/api/generate/stream')
+def generate_content_stream():
+    """Generate Instagram content from URL, streaming each part as a Server-Sent Event"""
+    topic = request.args.get('topic')
+    url = request.args.get('url')
+
+    if not topic or not url:
+        return ojsonify({
+            "success": False,
+            "error": "Both topic and URL are required"
+        }, 400)
+
+    def events():
+        try:
+            cache_key = _generation_cache_key(url, topic)
+            cached = _get_cached_result(cache_key)
+            if cached:
+                generated_content, filename = cached
+                yield _sse("done", {"content": generated_content.to_dict(), "filename": filename, "cached": True})
+                return
+
+            yield _sse("status", {"message": "Extracting content from URL..."})
+            content = generator.extract_content_from_url(url)
+            if not content:
+                yield _sse("failed", {"error": "Failed to extract content from URL"})
+                return
+
+            yield _sse("status", {"message": "Generating summary, caption and image..."})
+            text_future = _pipeline.submit(generator.generate_summary_and_caption, content, topic)
+            image_future = _pipeline.submit(generator.generate_instagram_image, content, topic)
+
+            generated = image_url = None
+            for future in as_completed((text_future, image_future)):
+                if future is text_future:
+                    generated = future.result()
+                    if not generated:
+                        yield _sse("failed", {"error": "Failed to generate summary and caption"})
+                        return
+                    yield _sse("summary", {"news_summary": generated["summary"]})
+                    yield _sse("caption", {
+                        "generated_caption": generated["caption"],
+                        "hashtags": generated["hashtags"]
+                    })
+                else:
+                    image_url = future.result()
+                    if not image_url:
+                        yield _sse("failed", {"error": "Failed to generate image"})
+                        return
+                    yield _sse("image", {"generated_image_url": image_url})
+
+            generated_content = _build_content(url, topic, generated, image_url)
+            filename = _store_result(cache_key, generated_content)
+            yield _sse("done", {"content": generated_content.to_dict(), "filename": filename})
+        except Exception as e:
+            yield _sse("failed", {"error": str(e)})
+
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 @app.route('/api/history')
 def get_history():
     """Get generation history (list of saved files)"""
     try:
+        if os.path.exists(HISTORY_INDEX):
+            return ojsonify({
+                "success": True,
+                "history": _read_history_index()
+            })
+
+        # No index yet: fall back to scanning saved files
         import glob
         json_files = glob.glob("generated_content_*.json")
 
         history = []
-        for file in sorted(json_files, reverse=True)[:10]:  # Last 10 files
-            try:
-                with open(file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    history.append({
-                        "filename": file,
-                        "topic": data.get("topic"),
-                        "created_at": data.get("created_at"),
-                        "has_image": bool(data.get("generated_image_url"))
-                    })
-            except:
+        for file in sorted(json_files, reverse=True)[:HISTORY_LIMIT]:  # Last 10 files
+            data = _read_result_file(file)
+            if data is None:
                 continue
 
-        return jsonify({
+            history.append({
+                "filename": file,
+                "topic": data.get("topic"),
+                "created_at": data.get("created_at"),
+                "has_image": bool(data.get("generated_image_url"))
+            })
+
+        return ojsonify({
             "success": True,
             "history": history
         })
 
     except Exception as e:
-        return jsonify({
+        return ojsonify({
             "success": False,
             "error": str(e)
-        }), 500
+        }, 500)
 
 if __name__ == '__main__':
     print("🚀 Starting Simple Web Interface for Instagram Content Generation")
     print("🔑 Using Z.ai API Key:", api_key[:10] + "..." + api_key[-6:])
     print("🌐 Open http://localhost:5000 in your browser")
     print("🛑 Press Ctrl+C to stop")
+    print("🏭 For production use: gunicorn -k gthread -w 4 --threads 8 wsgi:app")
 
+    # Development server only; the debugger/reloader is opt-in via FLASK_DEBUG=1
     app.run(
         host='0.0.0.0',
         port=5000,
-        debug=True
+        debug=os.getenv("FLASK_DEBUG") == "1"
     )
\ No newline at end of file
@@ -4,12 +4,64 @@ Simple Test Script untuk Instagram Automation
 Test API key dan basic functionality
 """
 
+import io
 import os
 import sys
 import json
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from datetime import datetime
 
+BASE_URL = "https://api.z.ai/api/paas/v4"
+CHAT_URL = f"{BASE_URL}/chat/completions"
+WEB_READER_URL = f"{BASE_URL}/tools/web-reader"
+IMAGE_URL = f"{BASE_URL}/images/generations"
+
+# Request bodies never change, so encode them once
+PING_PAYLOAD = json.dumps({
+    "model": "glm-4.6",
+    "messages": [{"role": "user", "content": "Hello, test connection"}],
+    "max_tokens": 10,
+    "temperature": 0.1
+}).encode("utf-8")
+
+WEB_READER_PAYLOAD = json.dumps({
+    "url": "https://www.detik.com/",  # Test with a simple URL
+    "format": "markdown"
+}).encode("utf-8")
+
+IMAGE_PAYLOAD = json.dumps({
+    "model": "cogview-4",
+    "prompt": """
+    Create a simple Instagram post image about "Technology News".
+    Style: Modern, clean, professional.
+    Size: 1024x1024
+    """,
+    "size": "1024x1024",
+    "quality": "hd",
+    "n": 1
+}).encode("utf-8")
+
+# Shared session so every test reuses the same keep-alive connection
+SESSION = requests.Session()
+SESSION.headers["Content-Type"] = "application/json"
+
+def configure_session(api_key):
+    """Attach the Z.ai API key to the shared session"""
+    SESSION.headers["Authorization"] = f"Bearer {api_key}"
+
+def run_probe(test_name, test_func):
+    """Run one probe with its output collected in its own buffer; returns (result, output)"""
+    buffer = io.StringIO()
+    log = partial(print, file=buffer)
+    try:
+        result = test_func(log)
+    except Exception as e:
+        log(f"❌ Test '{test_name}' crashed: {e}")
+        result = False
+    return result, buffer.getvalue()
+
 def test_environment():
     """Test environment setup"""
     print("🔍 Testing Environment Setup...")
@@ -32,154 +84,93 @@ def test_environment():
     print(f"✅ ZAI_API_KEY found: {api_key[:10]}...{api_key[-6:]}")
     return True
 
-def test_zai_connection(api_key):
+def test_zai_connection(log=print):
     """Test Z.ai API connection"""
-    print("\n🧪 Testing Z.ai API Connection...")
-
-    base_url = "https://api.z.ai/api/paas/v4"
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-
-    payload = {
-        "model": "glm-4.6",
-        "messages": [{"role": "user", "content": "Hello, test connection"}],
-        "max_tokens": 10,
-        "temperature": 0.1
-    }
+    log("\n🧪 Testing Z.ai API Connection...")
 
     try:
-        response = requests.post(
-            f"{base_url}/chat/completions",
-            headers=headers,
-            json=payload,
-            timeout=10
-        )
+        response = SESSION.post(CHAT_URL, data=PING_PAYLOAD, timeout=10)
 
         if response.status_code == 200:
             result = response.json()
             response_text = result['choices'][0]['message']['content']
-            print(f"✅ API Connection Successful!")
-            print(f"📝 Response: {response_text}")
+            log(f"✅ API Connection Successful!")
+            log(f"📝 Response: {response_text}")
             return True
         else:
-            print(f"❌ API Connection Failed: HTTP {response.status_code}")
-            print(f"📄 Response: {response.text}")
+            log(f"❌ API Connection Failed: HTTP {response.status_code}")
+            log(f"📄 Response: {response.text}")
             return False
 
     except Exception as e:
-        print(f"❌ API Connection Error: {e}")
+        log(f"❌ API Connection Error: {e}")
         return False
 
-def test_url_extraction():
+def test_url_extraction(log=print):
     """Test URL content extraction"""
-    print("\n📖 Testing URL Content Extraction...")
+    log("\n📖 Testing URL Content Extraction...")
 
     api_key = os.getenv("ZAI_API_KEY")
     if not api_key:
-        print("❌ No API key for testing")
+        log("❌ No API key for testing")
         return False
 
-    base_url = "https://api.z.ai/api/paas/v4"
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-
-    # Test with a simple URL
-    test_url = "https://www.detik.com/"
-
-    payload = {
-        "url": test_url,
-        "format": "markdown"
-    }
-
     try:
-        response = requests.post(
-            f"{base_url}/tools/web-reader",
-            headers=headers,
-            json=payload,
-            timeout=30
-        )
+        response = SESSION.post(WEB_READER_URL, data=WEB_READER_PAYLOAD, timeout=30)
 
         if response.status_code == 200:
             result = response.json()
             content = result.get('content', '')
             if content and len(content) > 100:
-                print(f"✅ Content Extraction Successful!")
-                print(f"📄 Extracted {len(content)} characters")
-                print(f"📝 Content Preview: {content[:200]}...")
+                log(f"✅ Content Extraction Successful!")
+                log(f"📄 Extracted {len(content)} characters")
+                log(f"📝 Content Preview: {content[:200]}...")
                 return True
             else:
-                print(f"❌ Content too short: {len(content)} characters")
+                log(f"❌ Content too short: {len(content)} characters")
                 return False
         else:
-            print(f"❌ Content Extraction Failed: HTTP {response.status_code}")
+            log(f"❌ Content Extraction Failed: HTTP {response.status_code}")
             return False
 
     except Exception as e:
-        print(f"❌ Content Extraction Error: {e}")
+        log(f"❌ Content Extraction Error: {e}")
         return False
 
-def test_image_generation():
+def test_image_generation(log=print):
     """Test image generation"""
-    print("\n🎨 Testing Image Generation...")
+    log("\n🎨 Testing Image Generation...")
 
     api_key = os.getenv("ZAI_API_KEY")
     if not api_key:
-        print("❌ No API key for testing")
+        log("❌ No API key for testing")
         return False
 
-    base_url = "https://api.z.ai/api/paas/v4"
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-
-    prompt = """
-    Create a simple Instagram post image about "Technology News".
-    Style: Modern, clean, professional.
-    Size: 1024x1024
-    """
-
-    payload = {
-        "model": "cogview-4",
-        "prompt": prompt,
-        "size": "1024x1024",
-        "quality": "hd",
-        "n": 1
-    }
-
     try:
-        response = requests.post(
-            f"{base_url}/images/generations",
-            headers=headers,
-            json=payload,
-            timeout=60
-        )
+        response = SESSION.post(IMAGE_URL, data=IMAGE_PAYLOAD, timeout=60)
 
         if response.status_code == 200:
             result = response.json()
             image_url = result['data'][0]['url']
-            print(f"✅ Image Generation Successful!")
-            print(f"🖼️ Image URL: {image_url}")
+            log(f"✅ Image Generation Successful!")
+            log(f"🖼️ Image URL: {image_url}")
 
             # Test if image is accessible
-            img_response = requests.head(image_url, timeout=10)
+            # The image lives on a CDN, so don't send it the Z.ai API key
+            img_response = SESSION.head(image_url, headers={"Authorization": None}, timeout=10)
             if img_response.status_code == 200:
-                print(f"✅ Image is accessible!")
+                log(f"✅ Image is accessible!")
                 return True
             else:
-                print(f"❌ Image not accessible: HTTP {img_response.status_code}")
+                log(f"❌ Image not accessible: HTTP {img_response.status_code}")
                 return False
         else:
-            print(f"❌ Image Generation Failed: HTTP {response.status_code}")
-            print(f"📄 Response: {response.text}")
+            log(f"❌ Image Generation Failed: HTTP {response.status_code}")
+            log(f"📄 Response: {response.text}")
             return False
 
     except Exception as e:
-        print(f"❌ Image Generation Error: {e}")
+        log(f"❌ Image Generation Error: {e}")
         return False
 
 def main():
@@ -200,22 +191,26 @@ def main():
         print("\n❌ No API key found!")
         return False
 
+    configure_session(api_key)
+
     # Run tests
     tests = [
-        ("API Connection", lambda: test_zai_connection(api_key)),
+        ("API Connection", test_zai_connection),
         ("URL Content Extraction", test_url_extraction),
         ("Image Generation", test_image_generation)
     ]
 
     results = []
 
-    for test_name, test_func in tests:
-        try:
-            result = test_func()
+    # The probes are independent, so run them concurrently over the shared session,
+    # collecting each one's output and printing it in order so the reports don't interleave
+    with ThreadPoolExecutor(max_workers=len(tests)) as executor:
+        futures = [(test_name, executor.submit(run_probe, test_name, test_func)) for test_name, test_func in tests]
+
+        for test_name, future in futures:
+            result, output = future.result()
+            print(output, end="")
             results.append((test_name, result))
-        except Exception as e:
-            print(f"❌ Test '{test_name}' crashed: {e}")
-            results.append((test_name, False))
 
     # Summary
     print("\n" + "=" * 50)
@@ -6,19 +6,217 @@ Focus: URL-based news processing (no mock data)
 """
 
 import os
+import re
 import sys
+import argparse
 import requests
-import json
+from requests.adapters import HTTPAdapter
+from requests.utils import DEFAULT_ACCEPT_ENCODING
+from urllib3.util.retry import Retry
+import orjson
+import sqlite3
+import hashlib
+import inspect
+import functools
 import time
+import socket
+import uuid
+import logging
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple
-from dataclasses import dataclass
+from urllib.parse import urlparse
+from collections import Counter
+from contextlib import closing
+from dataclasses import dataclass, field, fields
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-@dataclass
+logger = logging.getLogger(__name__)
+
+# Successful API results are cached on disk per (stage, input, topic)
+CACHE_PATH = ".zai_cache.sqlite3"
+CACHE_TTL = 7 * 86400
+CACHE_VERSION = 2  # Bump whenever prompts, models or sampling parameters change
+
+def _cached(stage: str):
+    """Serve a generator step from the response cache, storing successful results"""
+    def decorator(method):
+        signature = inspect.signature(method)
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if not self.use_cache:
+                return method(self, *args, **kwargs)
+
+            bound = signature.bind(self, *args, **kwargs)
+            bound.apply_defaults()
+            parts = [stage, str(CACHE_VERSION)] + [str(value) for value in list(bound.arguments.values())[1:]]
+            key = hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+            try:
+                with closing(sqlite3.connect(CACHE_PATH)) as db:
+                    row = db.execute(
+                        "SELECT value FROM responses WHERE key = ? AND expires_at > ?", (key, time.time())
+                    ).fetchone()
+            except sqlite3.Error as e:
+                logger.warning("⚠️  Cache read failed, running uncached: %s", e)
+                row = None
+            if row:
+                logger.info("♻️  Using cached %s", stage)
+                return orjson.loads(row[0])
+
+            result = method(self, *args, **kwargs)
+            if result:
+                try:
+                    with closing(sqlite3.connect(CACHE_PATH)) as db, db:
+                        db.execute(
+                            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?)",
+                            (key, orjson.dumps(result).decode("utf-8"), time.time() + CACHE_TTL)
+                        )
+                except sqlite3.Error as e:
+                    logger.warning("⚠️  Cache write failed: %s", e)
+            return result
+        return wrapper
+    return decorator
+
+# Extracted article text is capped here, so prompts, cache rows and memory stay bounded
+CONTENT_MAX_CHARS = 4000
+
+# Web-reader responses larger than this are rejected outright
+READER_MAX_BYTES = 5 * 1024 * 1024
+
+# Append-only index of saved result files, read by the web interface's /api/history
+HISTORY_INDEX = "history.jsonl"
+
+def _read_capped(response, limit: int) -> Optional[bytes]:
+    """Read a streamed response body, giving up as soon as it grows past limit bytes"""
+    declared = response.headers.get("Content-Length", "")
+    if declared.isdigit() and int(declared) > limit:
+        return None
+    body = bytearray()
+    for chunk in response.iter_content(chunk_size=65536):
+        body += chunk
+        if len(body) > limit:
+            return None
+    return bytes(body)
+
+def _validate_url(url: str) -> Optional[str]:
+    """Cheap local checks before spending an API call on a URL; returns an error message or None"""
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        return "URL must start with http:// or https:// and include a host"
+
+    try:
+        socket.getaddrinfo(parsed.hostname, parsed.port or 443, proto=socket.IPPROTO_TCP)
+    except (socket.gaierror, ValueError) as e:
+        return f"host cannot be resolved ({e})"
+
+    return None
+
+_HASHTAG_RE = re.compile(r'#\w+')
+
+# Control characters (except newline and tab) removed from generated text
+_CONTROL_CHARS = dict.fromkeys([c for c in range(0x20) if c not in (0x09, 0x0a)] + [0x7f])
+
+# Every chat call starts with the same system message, so the provider can reuse the cached prefix;
+# the user message carries only the task and its variable fields
+_SYSTEM_PROMPT = """
+Kamu adalah content writer berita untuk Instagram berbahasa Indonesia.
+
+Format ringkasan berita (summary):
+1. Judul yang menarik (1 baris)
+2. Ringkasan inti berita (2-3 kalimat)
+3. Poin-poin penting (maksimal 3 poin)
+4. Konteks atau dampak berita (1 kalimat)
+Style: ringkas dan padat, mudah dipahami, factual dan objektif, Bahasa Indonesia yang baik. Maksimal 150 kata.
+
+Format caption Instagram (caption):
+1. Hook yang menarik perhatian (1-2 kalimat dengan emoji)
+2. Summary berita dalam bahasa yang relatable (2-3 kalimat)
+3. Question atau call to action untuk engagement (1 kalimat)
+4. 3-5 hashtags yang relevan dan trending
+Style: friendly dan conversational, bahasa yang relatable, engagement-focused, Instagram native feel, tidak terlalu formal. Maksimal 200 kata.
+"""
+
+_SYSTEM_MSG = {"role": "system", "content": _SYSTEM_PROMPT}
+
+_SUMMARY_PROMPT_TMPL = """
+Buat ringkasan berita yang informatif dari konten berikut:
+
+Topik: {topic}
+Konten: {content}
+"""
+
+_CAPTION_PROMPT_TMPL = """
+Buat caption Instagram yang engagement dan menarik untuk berita ini:
+
+Topik: {topic}
+Ringkasan Berita: {news_summary}
+"""
+
+_SUMMARY_AND_CAPTION_PROMPT_TMPL = """
+Buat ringkasan berita dan caption Instagram dari konten berikut:
+
+Topik: {topic}
+Konten: {content}
+
+Jawab hanya dengan JSON object:
+{{"summary": "...", "caption": "...", "hashtags": ["#...", "#..."]}}
+"""
+
+_IMAGE_PROMPT_TMPL = """
+Create a professional, modern Instagram post image about:
+
+Topic: {topic}
+News Summary: {news_summary}...
+
+Style Requirements:
+- Instagram square format (1024x1024)
+- Modern, clean design
+- Professional typography
+- Eye-catching but readable
+- Social media optimized
+
+Text Overlay:
+- Include a headline related to: "{topic}"
+- Bold, readable font
+- Good contrast with background
+
+Visual Elements:
+- Background theme relevant to: {topic}
+- Professional color scheme
+- Clean, minimalist aesthetic
+- High quality, social media ready
+
+Style: Modern corporate, digital, technology-focused if applicable
+"""
+
+_SUMMARY_PAYLOAD_BASE = {"model": "glm-4.6", "max_tokens": 300, "temperature": 0.5}
+_CAPTION_PAYLOAD_BASE = {"model": "glm-4.6", "max_tokens": 400, "temperature": 0.7}
+_SUMMARY_AND_CAPTION_PAYLOAD_BASE = {
+    "model": "glm-4.6",
+    "max_tokens": 700,
+    "temperature": 0.6,
+    "response_format": {"type": "json_object"}
+}
+_IMAGE_PAYLOAD_BASE = {"model": "cogview-4", "size": "1024x1024", "quality": "hd", "n": 1}
+
+def result_filename(created_at: str) -> str:
+    """Result file name from the content's timestamp, unique even for saves within the same second"""
+    try:
+        created = datetime.fromisoformat(created_at)
+    except ValueError:
+        created = datetime.now()
+    return f"generated_content_{created:%Y%m%d_%H%M%S}_{uuid.uuid4().hex[:8]}.json"
+
+class AuthError(Exception):
+    """Z.ai rejected the API key"""
+
+@dataclass(slots=True, frozen=True)
 class NewsContent:
     """Data structure for processed news content"""
     title: str
@@ -29,7 +227,7 @@ class NewsContent:
     source: str
     processed_at: str
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class GeneratedContent:
     """Data structure for generated Instagram content"""
     topic: str
@@ -39,24 +237,101 @@ class GeneratedContent:
     generated_image_url: str
     hashtags: List[str]
     created_at: str
+    # Downloaded image, only when fetch_image=True was requested
+    image_bytes: Optional[bytes] = field(default=None, repr=False)
+
+    def to_dict(self) -> Dict:
+        """JSON-ready fields for API responses and saved files; raw image bytes are left out"""
+        return {f.name: getattr(self, f.name) for f in fields(self) if f.name != "image_bytes"}
 
 class URLContentGenerator:
     """URL-based content generator using Z.ai API"""
 
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, use_cache: bool = True):
         self.api_key = api_key
         self.base_url = "https://api.z.ai/api/paas/v4"
         self.headers = {
             "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
+            "Content-Type": "application/json",
+            "Accept-Encoding": DEFAULT_ACCEPT_ENCODING  # includes br when brotli is installed
         }
-
-        print(f"🔑 Initialized with API Key: {api_key[:10]}...{api_key[-6:]}")
+        self._encoding_logged = False
+
+        # Reuse keep-alive connections to api.z.ai across calls
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=8,
+            max_retries=Retry(
+                total=3,
+                backoff_factor=0.3,
+                status_forcelist=[429, 500, 502, 503, 504],
+                allowed_methods=frozenset({"GET", "POST"}),  # Every Z.ai call is a POST
+                read=0,  # A timed-out POST may still have run (and been billed), so never re-send it
+                raise_on_status=False  # Callers report the final HTTP status themselves
+            )
+        )
+        self.session.mount("https://", adapter)
+
+        self.use_cache = use_cache
+        if use_cache:
+            try:
+                with closing(sqlite3.connect(CACHE_PATH)) as db, db:
+                    db.execute(
+                        "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT, expires_at REAL)"
+                    )
+            except sqlite3.Error as e:
+                # Read-only deployments (e.g. serverless) simply run uncached
+                logger.warning("⚠️  Response cache disabled: %s", e)
+                self.use_cache = False
+
+        logger.info("🔑 Initialized with API Key: %s...%s", api_key[:10], api_key[-6:])
+
+    def close(self):
+        """Close the pooled HTTP session"""
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _raise_for_auth(self, response: requests.Response):
+        """Turn HTTP 401/403 into AuthError so a bad key stops the whole run"""
+        if response.status_code in (401, 403):
+            raise AuthError(f"Z.ai rejected the API key (HTTP {response.status_code}); check ZAI_API_KEY")
+
+    def _stream_chat(self, payload: Dict, timeout: int) -> Tuple[int, Optional[str]]:
+        """Run a chat completion with stream=True, joining the SSE content deltas as they arrive"""
+        with self.session.post(
+            f"{self.base_url}/chat/completions",
+            data=orjson.dumps({**payload, "stream": True}),
+            stream=True,
+            timeout=timeout
+        ) as response:
+            self._raise_for_auth(response)
+            if response.status_code != 200:
+                return response.status_code, None
+
+            parts = []
+            for line in response.iter_lines():
+                if not line.startswith(b"data:"):
+                    continue
+                data = line[5:].strip()
+                if data == b"[DONE]":
+                    break
+                choices = orjson.loads(data).get("choices")
+                if choices:
+                    parts.append(choices[0].get("delta", {}).get("content") or "")
+
+        return 200, "".join(parts)
 
     def test_api_connection(self) -> bool:
         """Test connection to Z.ai API"""
         try:
-            print("🧪 Testing API connection...")
+            logger.info("🧪 Testing API connection...")
 
             payload = {
                 "model": "glm-4.6",
@@ -65,269 +340,358 @@ class URLContentGenerator:
                 "temperature": 0.1
             }
 
-            response = requests.post(
+            response = self.session.post(
                 f"{self.base_url}/chat/completions",
-                headers=self.headers,
-                json=payload,
+                data=orjson.dumps(payload),
                 timeout=10
             )
 
             if response.status_code == 200:
-                print("✅ API connection successful!")
+                logger.info("✅ API connection successful!")
                 return True
             else:
-                print(f"❌ API connection failed: HTTP {response.status_code}")
+                logger.error("❌ API connection failed: HTTP %s", response.status_code)
                 return False
 
         except Exception as e:
-            print(f"❌ API connection error: {e}")
+            logger.error("❌ API connection error: %s", e)
             return False
 
+    @_cached("content")
     def extract_content_from_url(self, url: str) -> Optional[str]:
         """Extract content from URL using Z.ai Web Reader"""
         try:
-            print(f"📖 Extracting content from: {url}")
+            logger.info("📖 Extracting content from: %s", url)
+
+            error = _validate_url(url)
+            if error:
+                logger.error("❌ Invalid URL: %s", error)
+                return None
 
             payload = {
                 "url": url,
                 "format": "markdown"
             }
 
-            response = requests.post(
+            # Stream the body so an oversized page is dropped without downloading all of it
+            with self.session.post(
                 f"{self.base_url}/tools/web-reader",
-                headers=self.headers,
-                json=payload,
-                timeout=30
-            )
-
-            if response.status_code == 200:
-                result = response.json()
-                content = result.get('content', '')
-
-                if content and len(content) > 100:
-                    print(f"✅ Content extracted successfully ({len(content)} characters)")
-                    return content
-                else:
-                    print(f"❌ Content too short or empty: {len(content) if content else 0} characters")
+                data=orjson.dumps(payload),
+                timeout=30,
+                stream=True
+            ) as response:
+                self._raise_for_auth(response)
+
+                if response.status_code != 200:
+                    logger.error("❌ Failed to extract content: HTTP %s", response.status_code)
+                    logger.error("Response: %s", response.text)
                     return None
+
+                if not self._encoding_logged:
+                    self._encoding_logged = True
+                    logger.info("🗜️  Web reader Content-Encoding: %s", response.headers.get("Content-Encoding", "identity"))
+
+                body = _read_capped(response, READER_MAX_BYTES)
+
+            if body is None:
+                logger.error("❌ Web reader response larger than %d bytes", READER_MAX_BYTES)
+                return None
+
+            result = orjson.loads(body)
+            content = (result.get('content') or '')[:CONTENT_MAX_CHARS]
+
+            if content and len(content) > 100:
+                logger.info("✅ Content extracted successfully (%d characters)", len(content))
+                return content
             else:
-                print(f"❌ Failed to extract content: HTTP {response.status_code}")
-                print(f"Response: {response.text}")
+                logger.error("❌ Content too short or empty: %d characters", len(content) if content else 0)
                 return None
 
+        except AuthError:
+            raise
         except Exception as e:
-            print(f"❌ Error extracting content: {e}")
+            logger.error("❌ Error extracting content: %s", e)
             return None
 
+    @_cached("summary")
     def generate_news_summary(self, content: str, topic: str) -> Optional[str]:
         """Generate news summary using Z.ai"""
         try:
-            print("📝 Generating news summary...")
+            logger.info("📝 Generating news summary...")
 
-            prompt = f"""
-            Buat ringkasan berita yang informatif dari konten berikut:
+            prompt = _SUMMARY_PROMPT_TMPL.format(topic=topic, content=content)
 
-            Topik: {topic}
-            Konten: {content[:2000]}...
+            payload = {**_SUMMARY_PAYLOAD_BASE, "messages": [_SYSTEM_MSG, {"role": "user", "content": prompt}]}
 
-            Format ringkasan:
-            1. Judul yang menarik (1 baris)
-            2. Ringkasan inti berita (2-3 kalimat)
-            3. Poin-poin penting (maksimal 3 poin)
-            4. Konteks atau dampak berita (1 kalimat)
+            status_code, summary = self._stream_chat(payload, timeout=30)
 
-            Style:
-            - Ringkas dan padat
-            - Mudah dipahami
-            - Factual dan objektif
-            - Bahasa Indonesia yang baik
-
-            Maksimal 150 kata.
-            """
-
-            payload = {
-                "model": "glm-4.6",
-                "messages": [{"role": "user", "content": prompt}],
-                "max_tokens": 300,
-                "temperature": 0.5
-            }
-
-            response = requests.post(
-                f"{self.base_url}/chat/completions",
-                headers=self.headers,
-                json=payload,
-                timeout=30
-            )
-
-            if response.status_code == 200:
-                result = response.json()
-                summary = result['choices'][0]['message']['content']
-                print(f"✅ Summary generated ({len(summary)} characters)")
+            if status_code == 200:
+                logger.info("✅ Summary generated (%d characters)", len(summary))
                 return summary
             else:
-                print(f"❌ Failed to generate summary: HTTP {response.status_code}")
+                logger.error("❌ Failed to generate summary: HTTP %s", status_code)
                 return None
 
+        except AuthError:
+            raise
         except Exception as e:
-            print(f"❌ Error generating summary: {e}")
+            logger.error("❌ Error generating summary: %s", e)
             return None
 
+    @_cached("caption")
     def generate_instagram_caption(self, news_summary: str, topic: str) -> Optional[str]:
         """Generate Instagram caption from news summary"""
         try:
-            print("📱 Generating Instagram caption...")
+            logger.info("📱 Generating Instagram caption...")
 
-            prompt = f"""
-            Buat caption Instagram yang engagement dan menarik untuk berita ini:
+            prompt = _CAPTION_PROMPT_TMPL.format(topic=topic, news_summary=news_summary)
 
-            Topik: {topic}
-            Ringkasan Berita: {news_summary}
+            payload = {**_CAPTION_PAYLOAD_BASE, "messages": [_SYSTEM_MSG, {"role": "user", "content": prompt}]}
 
-            Format Caption Instagram:
-            1. Hook yang menarik perhatian (1-2 kalimat dengan emoji)
-            2. Summary berita dalam bahasa yang relatable (2-3 kalimat)
-            3. Question atau call to action untuk engagement (1 kalimat)
-            4. 3-5 hashtags yang relevan dan trending
+            status_code, caption = self._stream_chat(payload, timeout=30)
 
-            Style:
-            - Friendly dan conversational
-            - Menggunakan bahasa yang relatable
-            - Engagement-focused
-            - Instagram native feel
-            - Tidak terlalu formal
+            if status_code == 200:
+                logger.info("✅ Caption generated (%d characters)", len(caption))
+                return caption
+            else:
+                logger.error("❌ Failed to generate caption: HTTP %s", status_code)
+                return None
 
-            Maksimal 200 kata.
-            """
+        except AuthError:
+            raise
+        except Exception as e:
+            logger.error("❌ Error generating caption: %s", e)
+            return None
 
-            payload = {
-                "model": "glm-4.6",
-                "messages": [{"role": "user", "content": prompt}],
-                "max_tokens": 400,
-                "temperature": 0.7
-            }
+    @_cached("summary and caption")
+    def generate_summary_and_caption(self, content: str, topic: str) -> Optional[Dict]:
+        """Generate news summary, Instagram caption and hashtags in a single Z.ai call"""
+        try:
+            logger.info("📝 Generating news summary and Instagram caption...")
+
+            prompt = _SUMMARY_AND_CAPTION_PROMPT_TMPL.format(topic=topic, content=content)
+
+            payload = {**_SUMMARY_AND_CAPTION_PAYLOAD_BASE, "messages": [_SYSTEM_MSG, {"role": "user", "content": prompt}]}
 
-            response = requests.post(
+            response = self.session.post(
                 f"{self.base_url}/chat/completions",
-                headers=self.headers,
-                json=payload,
+                data=orjson.dumps(payload),
                 timeout=30
             )
 
+            self._raise_for_auth(response)
+
             if response.status_code == 200:
-                result = response.json()
-                caption = result['choices'][0]['message']['content']
-                print(f"✅ Caption generated ({len(caption)} characters)")
-                return caption
+                result = orjson.loads(response.content)
+                logger.debug("Prompt cache hit: %s tokens",
+                             result.get('usage', {}).get('prompt_tokens_details', {}).get('cached_tokens', 0))
+                generated = orjson.loads(result['choices'][0]['message']['content'])
+                summary = generated.get('summary')
+                caption = generated.get('caption')
+
+                if not summary or not caption:
+                    logger.error("❌ Summary or caption missing from response")
+                    return None
+
+                summary = self.clean_text(summary)
+                caption = self.clean_text(caption)
+                hashtags = self.dedupe_hashtags(generated.get('hashtags') or self.extract_hashtags(caption))
+                logger.info("✅ Summary (%d characters) and caption (%d characters) generated", len(summary), len(caption))
+                return {"summary": summary, "caption": caption, "hashtags": hashtags}
             else:
-                print(f"❌ Failed to generate caption: HTTP {response.status_code}")
+                logger.error("❌ Failed to generate summary and caption: HTTP %s", response.status_code)
                 return None
 
+        except AuthError:
+            raise
         except Exception as e:
-            print(f"❌ Error generating caption: {e}")
+            logger.error("❌ Error generating summary and caption: %s", e)
             return None
 
+    # Not cached: CogView image URLs expire well before CACHE_TTL
     def generate_instagram_image(self, news_summary: str, topic: str) -> Optional[str]:
         """Generate Instagram image using Z.ai CogView-4"""
         try:
-            print("🎨 Generating Instagram image...")
+            logger.info("🎨 Generating Instagram image...")
 
             # Extract key points from summary for better image prompt
-            prompt = f"""
-            Create a professional, modern Instagram post image about:
-
-            Topic: {topic}
-            News Summary: {news_summary[:200]}...
-
-            Style Requirements:
-            - Instagram square format (1024x1024)
-            - Modern, clean design
-            - Professional typography
-            - Eye-catching but readable
-            - Social media optimized
-
-            Text Overlay:
-            - Include a headline related to: "{topic}"
-            - Bold, readable font
-            - Good contrast with background
+            prompt = _IMAGE_PROMPT_TMPL.format(topic=topic, news_summary=news_summary[:200])
 
-            Visual Elements:
-            - Background theme relevant to: {topic}
-            - Professional color scheme
-            - Clean, minimalist aesthetic
-            - High quality, social media ready
+            payload = {**_IMAGE_PAYLOAD_BASE, "prompt": prompt}
 
-            Style: Modern corporate, digital, technology-focused if applicable
-            """
-
-            payload = {
-                "model": "cogview-4",
-                "prompt": prompt,
-                "size": "1024x1024",
-                "quality": "hd",
-                "n": 1
-            }
-
-            response = requests.post(
+            response = self.session.post(
                 f"{self.base_url}/images/generations",
-                headers=self.headers,
-                json=payload,
+                data=orjson.dumps(payload),
                 timeout=60
             )
 
+            self._raise_for_auth(response)
+
             if response.status_code == 200:
-                result = response.json()
+                result = orjson.loads(response.content)
                 image_url = result['data'][0]['url']
-                print(f"✅ Image generated: {image_url}")
+                logger.info("✅ Image generated: %s", image_url)
                 return image_url
             else:
-                print(f"❌ Failed to generate image: HTTP {response.status_code}")
-                print(f"Response: {response.text}")
+                logger.error("❌ Failed to generate image: HTTP %s", response.status_code)
+                logger.error("Response: %s", response.text)
                 return None
 
+        except AuthError:
+            raise
         except Exception as e:
-            print(f"❌ Error generating image: {e}")
+            logger.error("❌ Error generating image: %s", e)
             return None
 
-    def extract_hashtags(self, caption: str) -> List[str]:
-        """Extract hashtags from caption"""
-        import re
-        hashtags = re.findall(r'#\w+', caption)
-        return hashtags
+    def fetch_image(self, image_url: str) -> Optional[bytes]:
+        """Download a generated image from its CDN URL"""
+        try:
+            # The CDN is not Z.ai, so don't send it the API key
+            response = self.session.get(image_url, headers={"Authorization": None}, stream=True, timeout=30)
+            with response:
+                if response.status_code == 200:
+                    image_bytes = response.raw.read(decode_content=True)
+                    logger.info("✅ Image downloaded (%d bytes)", len(image_bytes))
+                    return image_bytes
+                logger.error("❌ Failed to download image: HTTP %s", response.status_code)
+                return None
 
-    def process_url_content(self, url: str, topic: str) -> Optional[GeneratedContent]:
-        """Main workflow: Process URL content and generate Instagram content"""
+        except Exception as e:
+            logger.error("❌ Error downloading image: %s", e)
+            return None
 
-        print(f"\n🚀 Processing URL content...")
-        print(f"📰 URL: {url}")
-        print(f"🏷️  Topic: {topic}")
-        print("=" * 60)
+    def extract_hashtags(self, caption: str) -> List[str]:
+        """Extract hashtags from caption"""
+        return _HASHTAG_RE.findall(caption)
+
+    def rank_hashtags(self, captions: List[str], top_n: int = 10) -> List[Tuple[str, int]]:
+        """Rank hashtags by how often they appear across captions (case-insensitive)"""
+        counts = Counter()
+        spelling = {}
+        for caption in captions:
+            for tag in _HASHTAG_RE.findall(caption):
+                key = tag.lower()
+                counts[key] += 1
+                spelling.setdefault(key, tag)
+        return [(spelling[key], count) for key, count in counts.most_common(top_n)]
+
+    def clean_text(self, text: str) -> str:
+        """Remove control characters and surrounding whitespace from generated text"""
+        return text.translate(_CONTROL_CHARS).strip()
+
+    def dedupe_hashtags(self, hashtags: List[str]) -> List[str]:
+        """Normalize hashtags to '#tag' form and drop case-insensitive duplicates, keeping order"""
+        unique = {}
+        for tag in hashtags:
+            tag = str(tag).strip().lstrip('#')
+            if tag:
+                unique.setdefault(tag.lower(), f"#{tag}")
+        return list(unique.values())
+
+    def process_url_content(self, url: str, topic: str, fetch_image: bool = False) -> Optional[GeneratedContent]:
+        """Main workflow: Process URL content and generate Instagram content
+
+        With fetch_image=True the image is also downloaded (into image_bytes) while the caption is written.
+        """
+
+        logger.info("🚀 Processing URL content...")
+        logger.info("📰 URL: %s", url)
+        logger.info("🏷️  Topic: %s", topic)
+        logger.info("=" * 60)
 
         # Step 1: Extract content from URL
         content = self.extract_content_from_url(url)
         if not content:
-            print("❌ Failed to extract content from URL")
+            logger.error("❌ Failed to extract content from URL")
             return None
 
         # Step 2: Generate news summary
         news_summary = self.generate_news_summary(content, topic)
         if not news_summary:
-            print("❌ Failed to generate news summary")
+            logger.error("❌ Failed to generate news summary")
+            return None
+
+        # Steps 3-4: Caption and image both only need the summary, so generate them concurrently
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            caption_future = executor.submit(self.generate_instagram_caption, news_summary, topic)
+            image_future = executor.submit(self._generate_image, news_summary, topic, fetch_image)
+            caption, (image_url, image_bytes) = caption_future.result(), image_future.result()
+
+        return self._assemble_content(url, topic, news_summary, caption, image_url, image_bytes)
+
+    def process_urls(self, jobs: List[Tuple[str, str]], max_concurrency: int = 4,
+                     fetch_image: bool = False) -> List[Optional[GeneratedContent]]:
+        """Process several (url, topic) jobs concurrently; results follow job order, None for failures
+
+        AuthError is not treated as a per-job failure: it cancels the queued jobs and is re-raised.
+        """
+        results: List[Optional[GeneratedContent]] = [None] * len(jobs)
+
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            futures = {executor.submit(self.process_url_content, url, topic, fetch_image): i for i, (url, topic) in enumerate(jobs)}
+
+            for done, future in enumerate(as_completed(futures), 1):
+                index = futures[future]
+                try:
+                    results[index] = future.result()
+                except AuthError:
+                    # A bad key fails every job the same way, so drop the queued ones and stop
+                    for pending in futures:
+                        pending.cancel()
+                    raise
+                except Exception as e:
+                    logger.error("❌ Error processing %s: %s", jobs[index][0], e)
+                status = "✅" if results[index] else "❌"
+                logger.info("%s [%d/%d] %s", status, done, len(jobs), jobs[index][0])
+
+        return results
+
+    async def aprocess_url_content_combined(self, url: str, topic: str,
+                                            fetch_image: bool = False) -> Optional[GeneratedContent]:
+        """Web pipeline: a faster variant of process_url_content, not an async twin of it
+
+        Summary, caption and hashtags come from one JSON-mode chat call (cleaned and de-duplicated),
+        and the image is generated from the extracted article in parallel, so output differs from the CLI.
+        """
+        content = await asyncio.to_thread(self.extract_content_from_url, url)
+        if not content:
+            logger.error("❌ Failed to extract content from URL")
             return None
 
-        # Step 3: Generate Instagram caption
-        caption = self.generate_instagram_caption(news_summary, topic)
+        generated, (image_url, image_bytes) = await asyncio.gather(
+            asyncio.to_thread(self.generate_summary_and_caption, content, topic),
+            asyncio.to_thread(self._generate_image, content, topic, fetch_image)
+        )
+        if not generated:
+            logger.error("❌ Failed to generate news summary")
+            return None
+
+        return self._assemble_content(url, topic, generated["summary"], generated["caption"], image_url,
+                                      image_bytes, hashtags=generated["hashtags"])
+
+    def _generate_image(self, source_text: str, topic: str,
+                        fetch_image: bool) -> Tuple[Optional[str], Optional[bytes]]:
+        """Generate the image and, if asked, download it while the caption is still being written"""
+        image_url = self.generate_instagram_image(source_text, topic)
+        if not image_url or not fetch_image:
+            return image_url, None
+        return image_url, self.fetch_image(image_url)
+
+    def _assemble_content(self, url: str, topic: str, news_summary: str, caption: Optional[str],
+                          image_url: Optional[str], image_bytes: Optional[bytes] = None,
+                          hashtags: Optional[List[str]] = None) -> Optional[GeneratedContent]:
+        """Check the generated pieces and combine them into a GeneratedContent"""
         if not caption:
-            print("❌ Failed to generate Instagram caption")
+            logger.error("❌ Failed to generate Instagram caption")
             return None
 
-        # Step 4: Generate Instagram image
-        image_url = self.generate_instagram_image(news_summary, topic)
         if not image_url:
-            print("❌ Failed to generate Instagram image")
+            logger.error("❌ Failed to generate Instagram image")
             return None
 
-        # Step 5: Extract hashtags
-        hashtags = self.extract_hashtags(caption)
+        # Step 5: Extract hashtags, unless the model already returned them
+        if hashtags is None:
+            hashtags = self.extract_hashtags(caption)
 
         # Step 6: Create result object
         result = GeneratedContent(
@@ -337,10 +701,11 @@ class URLContentGenerator:
             generated_caption=caption,
             generated_image_url=image_url,
             hashtags=hashtags,
-            created_at=datetime.now().isoformat()
+            created_at=datetime.now().isoformat(timespec="seconds"),
+            image_bytes=image_bytes
         )
 
-        print(f"\n✅ Content generation completed successfully!")
+        logger.info("✅ Content generation completed successfully!")
         return result
 
     def display_results(self, content: GeneratedContent):
@@ -374,36 +739,51 @@ class URLContentGenerator:
         print(f"\n💾 Content saved and ready to use!")
 
     def save_results_to_file(self, content: GeneratedContent, filename: str = None) -> str:
-        """Save generated content to JSON file"""
+        """Save generated content to JSON file and record it in the history index"""
 
         if not filename:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"generated_content_{timestamp}.json"
+            filename = result_filename(content.created_at)
 
-        content_dict = {
-            "topic": content.topic,
-            "original_url": content.original_url,
-            "news_summary": content.news_summary,
-            "generated_caption": content.generated_caption,
-            "generated_image_url": content.generated_image_url,
-            "hashtags": content.hashtags,
-            "created_at": content.created_at
-        }
+        payload = orjson.dumps(content.to_dict(), option=orjson.OPT_INDENT_2)
+        tmp_path = None
 
         try:
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(content_dict, f, ensure_ascii=False, indent=2)
-
-            print(f"💾 Results saved to: {filename}")
-            return filename
+            # Write a sibling temp file, then rename it, so readers never see a partial file
+            tmp_path = f"{filename}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, 'xb') as f:
+                f.write(payload)
+            os.replace(tmp_path, filename)
 
+            logger.info("💾 Results saved to: %s", filename)
         except Exception as e:
-            print(f"❌ Error saving results: {e}")
+            logger.error("❌ Error saving results: %s", e)
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
             return ""
 
+        # Every save path records itself, so CLI results show up in the web history too
+        entry = {
+            "filename": filename,
+            "topic": content.topic,
+            "created_at": content.created_at,
+            "has_image": bool(content.generated_image_url)
+        }
+        try:
+            with open(HISTORY_INDEX, 'ab') as f:
+                f.write(orjson.dumps(entry) + b"\n")
+        except OSError as e:
+            logger.warning("⚠️ Could not update %s: %s", HISTORY_INDEX, e)
+        return filename
+
 def main():
     """Main function for URL-based content generation"""
 
+    parser = argparse.ArgumentParser(description='URL-Specific Instagram Content Generator')
+    parser.add_argument('--health-check', action='store_true', help='Only test the Z.ai API connection')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
     print("🤖 URL-Specific Instagram Content Generator")
     print("Using Z.ai API - Real Content Generation")
     print("=" * 60)
@@ -417,13 +797,18 @@ def main():
         return
 
     # Initialize generator
-    generator = URLContentGenerator(api_key)
+    with URLContentGenerator(api_key) as generator:
+        if args.health_check:
+            if not generator.test_api_connection():
+                print("❌ Failed to connect to Z.ai API")
+                print("Please check your API key and internet connection")
+                sys.exit(1)
+            return
 
-    # Test API connection
-    if not generator.test_api_connection():
-        print("❌ Failed to connect to Z.ai API")
-        print("Please check your API key and internet connection")
-        return
+        run_interactive(generator)
+
+def run_interactive(generator: URLContentGenerator):
+    """Prompt for a topic and URL, then generate, display and save the content"""
 
     # Get user input
     print(f"\n📝 Enter content details:")
@@ -459,6 +844,9 @@ def main():
 
     except KeyboardInterrupt:
         print(f"\n⏹️  Process interrupted by user")
+    except AuthError as e:
+        print(f"\n❌ {e}")
+        print("Please check your API key in the .env file")
     except Exception as e:
         print(f"\n❌ Unexpected error: {e}")
         import traceback
@@ -0,0 +1,7 @@
+#!/usr/bin/env python3
+"""
+WSGI entry point for the Simple Web Interface
+Production: gunicorn -k gthread -w 4 --threads 8 wsgi:app
+"""
+
+from simple_web_interface import app